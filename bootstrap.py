@@ -0,0 +1,85 @@
+import numpy as np
+
+n_resamples = 2000
+confidence_level = 0.95
+seed = 42
+# Durations are binned to this relative width before resampling, percentiles move by at most half of it
+bin_precision = 0.001
+# Upper bound of weights kept in memory at once (resamples x bins)
+max_batch_elements = 20000000
+
+
+def bin_durations(durations, precision=bin_precision):
+    # Logarithmic bins keep the number of distinct values small for integer microseconds and float
+    # milliseconds alike, every bin is represented by the mean of its durations
+    keys = np.round(np.log(np.maximum(durations, 1e-9)) / np.log1p(precision)).astype(np.int64)
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return np.bincount(inverse, weights=durations) / counts, counts
+
+
+def resample_weights(rng, run_labels, counts, run_count, size):
+    # Two-level bootstrap: runs are drawn with replacement, then every request of a run drawn k times
+    # gets a Poisson(k) weight, the large-sample equivalent of resampling its requests k times.
+    # A bin holding c requests gets a Poisson(k * c) weight.
+    run_draws = rng.multinomial(run_count, np.full(run_count, 1 / run_count), size=size)
+    return rng.poisson(run_draws[:, run_labels] * counts)
+
+
+def weighted_percentiles(sorted_values, weights, percentiles):
+    cumulative = np.cumsum(weights, axis=1)
+    totals = cumulative[:, -1]
+    results = []
+    for percentile in percentiles:
+        targets = np.ceil(totals * percentile / 100)
+        indices = (cumulative < targets[:, None]).sum(axis=1)
+        values = sorted_values[np.minimum(indices, len(sorted_values) - 1)]
+        values[totals == 0] = np.nan
+        results.append(values)
+    return results
+
+
+def confidence_interval(samples, confidence=confidence_level):
+    samples = samples[~np.isnan(samples)]
+    if len(samples) == 0:
+        return '-', '-'
+    lower, upper = np.percentile(samples, [(1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100])
+    return round(float(lower), 2), round(float(upper), 2)
+
+
+def bootstrap_latency(runs, resamples=n_resamples, confidence=confidence_level, random_seed=seed):
+    runs = [np.asarray(run, dtype=float) for run in runs if len(run) > 0]
+    if not runs:
+        return {'mean': ('-', '-'), '95th': ('-', '-'), '99th': ('-', '-')}
+
+    binned_runs = [bin_durations(run) for run in runs]
+    values = np.concatenate([run_values for run_values, _ in binned_runs])
+    counts = np.concatenate([run_counts for _, run_counts in binned_runs])
+    run_labels = np.repeat(np.arange(len(runs)), [len(run_values) for run_values, _ in binned_runs])
+    order = np.argsort(values, kind='stable')
+    values, counts, run_labels = values[order], counts[order], run_labels[order]
+
+    rng = np.random.default_rng(random_seed)
+    batch_size = max(1, min(resamples, max_batch_elements // len(values)))
+    means, p95, p99 = [], [], []
+    for start in range(0, resamples, batch_size):
+        weights = resample_weights(rng, run_labels, counts, len(runs), min(batch_size, resamples - start))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means.append((weights @ values) / weights.sum(axis=1))
+        batch_p95, batch_p99 = weighted_percentiles(values, weights, [95, 99])
+        p95.append(batch_p95)
+        p99.append(batch_p99)
+
+    return {
+        'mean': confidence_interval(np.concatenate(means), confidence),
+        '95th': confidence_interval(np.concatenate(p95), confidence),
+        '99th': confidence_interval(np.concatenate(p99), confidence),
+    }
+
+
+def bootstrap_run_average(run_averages, resamples=n_resamples, confidence=confidence_level, random_seed=seed):
+    run_averages = np.asarray(run_averages, dtype=float)
+    if len(run_averages) == 0:
+        return '-', '-'
+    rng = np.random.default_rng(random_seed)
+    indices = rng.integers(0, len(run_averages), size=(resamples, len(run_averages)))
+    return confidence_interval(run_averages[indices].mean(axis=1), confidence)
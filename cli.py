@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import sys
+
+from plotting import metric_titles
+
+# Heavy dependencies (pandas, matplotlib, scipy, elasticsearch) are imported inside the
+# subcommands, so e.g. `merge` or `pretty` do not pay for them
+default_config = 'config.json'
+usage_modules = {'cpu': 'cpu_usage_all_new', 'memory': 'memory_usage'}
+
+
+def load_config(file_path):
+    if not os.path.exists(file_path):
+        sys.exit(f"Config file not found: {file_path} (see config.example.json)")
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+def experiment_matrix(args):
+    config = load_config(args.config)
+    experiments = args.experiment or config['experiments']
+    protocols = args.protocol or config['protocols']
+    return config, experiments, protocols
+
+
+def run_export(args):
+    import elastic
+
+    settings = load_config(args.config)['elasticsearch']
+    es = elastic.connect(settings['hosts'], settings['username'], settings['password'],
+                         settings.get('verify_certs', False))
+    index_name = args.index or settings['index_prefix'] + args.start[:10]
+    elastic.export_traces(es, index_name, args.start, args.minutes, args.output)
+
+
+def run_merge(args):
+    from merge_traces import merge_jaeger_traces
+
+    output_file = args.output or os.path.join(args.directory, 'merged_traces.json')
+    merge_jaeger_traces(args.directory, output_file)
+
+
+def run_pretty(args):
+    import structure_json
+
+    structure_json.main(args.input, args.output)
+
+
+def run_latency(args):
+    import traces
+
+    config, experiments, protocols = experiment_matrix(args)
+    sample_rate = args.sample_rate if args.sample_rate is not None else config.get('sample_rate')
+    for experiment in experiments:
+        print(f"Experiment: {experiment}")
+        traces.process_protocol(config['base_directory'], experiment, protocols, sample_rate)
+
+
+def run_breakdown(args):
+    import span_breakdown
+
+    config, experiments, protocols = experiment_matrix(args)
+    sample_rate = args.sample_rate if args.sample_rate is not None else config.get('sample_rate')
+    for experiment in experiments:
+        print(f"Experiment: {experiment}")
+        summary = span_breakdown.process_protocol(config['base_directory'], experiment, protocols, sample_rate)
+        if args.output and summary is not None:
+            summary.to_csv(args.output.format(experiment=experiment), index=False)
+
+
+def run_usage(args):
+    import importlib
+
+    module = importlib.import_module(usage_modules[args.command])
+    ylabel, title = metric_titles[args.command]
+    config, experiments, protocols = experiment_matrix(args)
+    for experiment in experiments:
+        print(f"Experiment: {experiment}")
+        results, protocol_averages = module.process_protocol(config['base_directory'], experiment, protocols)
+        if args.output:
+            with open(args.output.format(experiment=experiment), 'w') as f:
+                json.dump({'metric': args.command, 'experiment': experiment, 'protocols': protocols,
+                           'averages': protocol_averages, 'results': results}, f, indent=4)
+        if not args.no_plot:
+            from plotting import plot_protocol_averages
+            plot_protocol_averages(protocols, protocol_averages, ylabel, f"{title} ({experiment})")
+
+
+def run_plot(args):
+    from plotting import plot_protocol_averages
+
+    for input_file in args.input:
+        with open(input_file, 'r') as f:
+            data = json.load(f)
+        ylabel, title = metric_titles[data['metric']]
+        output_file = os.path.splitext(input_file)[0] + '.png' if args.save else None
+        plot_protocol_averages(data['protocols'], data['averages'], ylabel, f"{title} ({data['experiment']})",
+                               output_file)
+
+
+def run_sweep(args):
+    import sweep
+
+    config = load_config(args.config)
+    sample_rate = args.sample_rate if args.sample_rate is not None else config.get('sample_rate')
+    failed = sweep.sweep(config['base_directory'], args.experiment or config.get('experiments'),
+                         args.protocol or config.get('protocols'), config.get('results_directory'), sample_rate,
+                         args.workers, args.force)
+    if failed:
+        sys.exit(f"{len(failed)} tasks failed or were skipped: {', '.join(sorted(failed))}")
+
+
+def sample_rate_argument(value):
+    sample_rate = float(value)
+    if not 0 < sample_rate <= 1:
+        raise argparse.ArgumentTypeError(f"must be in (0, 1], got {value}")
+    return sample_rate
+
+
+def add_matrix_arguments(parser):
+    parser.add_argument('--experiment', action='append', help="experiment to process, repeatable "
+                                                              "(default: all experiments from the config)")
+    parser.add_argument('--protocol', action='append', help="protocol to process, repeatable "
+                                                            "(default: all protocols from the config)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Analysis of the communication protocol experiments")
+    parser.add_argument('--config', default=default_config, help=f"JSON config file (default: {default_config})")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export = subparsers.add_parser('export', help="export Jaeger spans from Elasticsearch into a traces file")
+    export.add_argument('start', help="start of the test, e.g. 2024-06-10T22:19:52")
+    export.add_argument('--minutes', type=float, default=5.1, help="length of the exported window")
+    export.add_argument('--index', help="index name (default: index_prefix from the config + start date)")
+    export.add_argument('--output', default='output_data.json')
+    export.set_defaults(handler=run_export)
+
+    merge = subparsers.add_parser('merge', help="merge traces-*.json files of a run directory")
+    merge.add_argument('directory')
+    merge.add_argument('--output', help="default: <directory>/merged_traces.json")
+    merge.set_defaults(handler=run_merge)
+
+    pretty = subparsers.add_parser('pretty', help="save an indented copy of a JSON file")
+    pretty.add_argument('input')
+    pretty.add_argument('--output', default='structured.json')
+    pretty.set_defaults(handler=run_pretty)
+
+    for name, handler, help_text in (('latency', run_latency, "response time report from traces"),
+                                     ('breakdown', run_breakdown, "per-service self-time and critical path")):
+        analysis = subparsers.add_parser(name, help=help_text)
+        add_matrix_arguments(analysis)
+        analysis.add_argument('--sample-rate', type=sample_rate_argument, help="fraction of traces to analyse (default: config)")
+        analysis.set_defaults(handler=handler)
+    subparsers.choices['breakdown'].add_argument('--output', help="CSV file, may contain {experiment}")
+
+    for name in usage_modules:
+        usage = subparsers.add_parser(name, help=f"average {name} usage per protocol")
+        add_matrix_arguments(usage)
+        usage.add_argument('--output', help="JSON results file for `plot`, may contain {experiment}")
+        usage.add_argument('--no-plot', action='store_true', help="do not show the chart")
+        usage.set_defaults(handler=run_usage)
+
+    plot = subparsers.add_parser('plot', help="chart from results saved by `cpu` or `memory`")
+    plot.add_argument('input', nargs='+')
+    plot.add_argument('--save', action='store_true', help="save the chart next to the input as PNG")
+    plot.set_defaults(handler=run_plot)
+
+    sweep = subparsers.add_parser('sweep', help="run every analysis for all runs found under base_directory")
+    add_matrix_arguments(sweep)
+    sweep.add_argument('--sample-rate', type=sample_rate_argument, help="fraction of traces to analyse (default: config)")
+    sweep.add_argument('--workers', type=int, help="number of worker processes (default: CPU count)")
+    sweep.add_argument('--force', action='store_true', help="run tasks even if their outputs are up to date")
+    sweep.set_defaults(handler=run_sweep)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
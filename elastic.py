@@ -2,35 +2,32 @@ from elasticsearch import Elasticsearch
 from datetime import datetime, timedelta
 import json
 
-# Connection settings
-es = Elasticsearch(
-    ['https://localhost:9200'],
-    http_auth=('elastic', 'Hc1ME0C48V827KEKf71ziI6Q'),
-    verify_certs=False
-)
-
-# Date and time inputs
-start_datetime_input = "2024-06-10T22:19:52"
-start_datetime = datetime.strptime(start_datetime_input, "%Y-%m-%dT%H:%M:%S")
-end_datetime = start_datetime + timedelta(minutes=5.1)
-
-# Elasticsearch query
-query = {
-    "query": {
-        "range": {
-            "startTime": {
-                "gte": int(start_datetime.timestamp() * 1e6),  # Convert to microseconds
-                "lte": int(end_datetime.timestamp() * 1e6)
-            }
-        }
-    },
-    "sort": [{"startTime": {"order": "asc"}}, "_doc"],  # Add _doc to maintain a consistent order
-    "size": 10000
-}
 
-index_name = "my-prefix-jaeger-span-2024-06-10"
-search_after = None
-traces = {}
+def connect(hosts, username, password, verify_certs=False):
+    return Elasticsearch(
+        hosts,
+        http_auth=(username, password),
+        verify_certs=verify_certs
+    )
+
+
+def build_query(start_datetime_input, minutes=5.1):
+    start_datetime = datetime.strptime(start_datetime_input, "%Y-%m-%dT%H:%M:%S")
+    end_datetime = start_datetime + timedelta(minutes=minutes)
+
+    # Elasticsearch query
+    return {
+        "query": {
+            "range": {
+                "startTime": {
+                    "gte": int(start_datetime.timestamp() * 1e6),  # Convert to microseconds
+                    "lte": int(end_datetime.timestamp() * 1e6)
+                }
+            }
+        },
+        "sort": [{"startTime": {"order": "asc"}}, "_doc"],  # Add _doc to maintain a consistent order
+        "size": 10000
+    }
 
 
 def format_span(span):
@@ -79,37 +76,49 @@ def sort_and_resolve_references(trace):
     trace['spans'] = sorted_spans
 
 
-while True:
-    if search_after:
-        query['search_after'] = search_after
-    response = es.search(index=index_name, body=query)
-    if not response['hits']['hits']:
-        break
-    for hit in response['hits']['hits']:
-        formatted_span = format_span(hit)
-        trace_id = formatted_span['traceID']
-        if trace_id not in traces:
-            traces[trace_id] = {"spans": [], "processes": {}}
-        traces[trace_id]["spans"].append(formatted_span)
-        service_name = formatted_span['process']['serviceName']
-        if service_name not in traces[trace_id]["processes"]:
-            traces[trace_id]["processes"][service_name] = formatted_span['process']
-    print(f"Traces found: {len(traces)}")
-    search_after = response['hits']['hits'][-1]['sort']
-
-
-print(f"Final Traces found: {len(traces)}. Sorting and resolving references...")
-for trace in traces.values():
-    sort_and_resolve_references(trace)
-
-
-# Formatting the final output
-formatted_output = [{"traceID": trace_id, "spans": trace["spans"], "processes": trace["processes"]} for trace_id, trace
-                    in traces.items()]
-
-# Saving the output to a file
-output_file_path = 'output_data.json'
-with open(output_file_path, 'w') as f:
-    json.dump({"data": formatted_output}, f)
-
-print(f"Data successfully saved to {output_file_path}")
+def export_traces(es, index_name, start_datetime_input, minutes=5.1, output_file_path='output_data.json'):
+    query = build_query(start_datetime_input, minutes)
+    search_after = None
+    traces = {}
+
+    while True:
+        if search_after:
+            query['search_after'] = search_after
+        response = es.search(index=index_name, body=query)
+        if not response['hits']['hits']:
+            break
+        for hit in response['hits']['hits']:
+            formatted_span = format_span(hit)
+            trace_id = formatted_span['traceID']
+            if trace_id not in traces:
+                traces[trace_id] = {"spans": [], "processes": {}}
+            traces[trace_id]["spans"].append(formatted_span)
+            service_name = formatted_span['process']['serviceName']
+            if service_name not in traces[trace_id]["processes"]:
+                traces[trace_id]["processes"][service_name] = formatted_span['process']
+        print(f"Traces found: {len(traces)}")
+        search_after = response['hits']['hits'][-1]['sort']
+
+    print(f"Final Traces found: {len(traces)}. Sorting and resolving references...")
+    for trace in traces.values():
+        sort_and_resolve_references(trace)
+
+    # Formatting the final output
+    formatted_output = [{"traceID": trace_id, "spans": trace["spans"], "processes": trace["processes"]}
+                        for trace_id, trace in traces.items()]
+
+    # Saving the output to a file
+    with open(output_file_path, 'w') as f:
+        json.dump({"data": formatted_output}, f)
+
+    print(f"Data successfully saved to {output_file_path}")
+
+
+def main():
+    # Connection settings
+    es = connect(['https://localhost:9200'], 'elastic', 'Hc1ME0C48V827KEKf71ziI6Q')
+    export_traces(es, "my-prefix-jaeger-span-2024-06-10", "2024-06-10T22:19:52")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 import math
 
 import pandas as pd
-import matplotlib.pyplot as plt
 import os
 import json
 
+from bootstrap import bootstrap_run_average
+from plotting import metric_titles, plot_protocol_averages
+
 max_memory = 725  # Maximum memory in MB
 
 
@@ -80,12 +82,35 @@ def calculate_average_memory_usage(file_path, start_time, end_time):
     return round(average_memory_usage, 2), filtered_data['Time'].min()
 
 
-def process_protocol(base_directory, experiment):
-    protocols = ['rest', 'grpc', 'thrift', 'RabbitMQ sync', 'RabbitMQ async', 'kafka sync', 'kafka async']
+def process_run(run_path, microservice, start_time, end_time, protocol, experiment, run):
+    if protocol == 'grpc' and int(run) == 1 and microservice == 'M1' and experiment == '100u1000p':
+        return None
+    microservice_path = os.path.join(run_path, microservice)
+    memory_files = [f for f in os.listdir(microservice_path) if
+                    f.startswith('Memory heap') and f.endswith('.csv')]
+
+    run_data = {"instances": []}
+    total_avg_usage = 0
+    for csv_file in memory_files:
+        full_path = os.path.join(microservice_path, csv_file)
+        avg_usage, instance_start_time = calculate_average_memory_usage(full_path, start_time, end_time)
+        if avg_usage is not None and not math.isnan(avg_usage):
+            instance_data = {
+                "started_at": instance_start_time.strftime('%Y-%m-%d %H:%M:%S'),
+                "average_memory_usage": avg_usage,
+                "file_path": full_path,
+            }
+            run_data["instances"].append(instance_data)
+            total_avg_usage += avg_usage
+
+    run_data["total_average_memory_usage"] = round(total_avg_usage, 2)
+    return run_data
+
+
+def process_protocol(base_directory, experiment, protocols):
     microservices = ['M1', 'M2']
     results = {}
     protocol_averages = {microservice: [] for microservice in microservices}
-    protocol_labels = ['REST', 'gRPC', 'Thrift', 'RabbitMQ sync', 'RabbitMQ async', 'Kafka sync', 'Kafka async']
 
     for protocol in protocols:
         protocol_data = {}
@@ -102,32 +127,16 @@ def process_protocol(base_directory, experiment):
                     start_time, end_time = extract_times_from_simulation_log(log_file_path, protocol)
                     # print duration in minutes
                     print(f"Duration: {(end_time - start_time).seconds / 60} minutes")
-                    microservice_path = os.path.join(run_path, microservice)
-                    memory_files = [f for f in os.listdir(microservice_path) if
-                                    f.startswith('Memory heap') and f.endswith('.csv')]
-
-                    run_data = {"instances": []}
-                    total_avg_usage = 0
-                    if protocol == 'grpc' and i == 1 and microservice == 'M1' and experiment == '100u1000p':
+                    run_data = process_run(run_path, microservice, start_time, end_time, protocol, experiment, i)
+                    if run_data is None:
                         continue
-                    for csv_file in memory_files:
-                        full_path = os.path.join(microservice_path, csv_file)
-                        avg_usage, instance_start_time = calculate_average_memory_usage(full_path, start_time, end_time)
-                        if avg_usage is not None and not math.isnan(avg_usage):
-                            instance_data = {
-                                "started_at": instance_start_time.strftime('%Y-%m-%d %H:%M:%S'),
-                                "average_memory_usage": avg_usage,
-                                "file_path": full_path,
-                            }
-                            run_data["instances"].append(instance_data)
-                            total_avg_usage += avg_usage
-
-                    run_data["total_average_memory_usage"] = round(total_avg_usage, 2)
                     microservice_data["runs"].append(run_data)
 
             protocol_data[microservice] = microservice_data
             avg = sum([run["total_average_memory_usage"] for run in microservice_data["runs"]]) / len(
                 microservice_data["runs"])
+            microservice_data["ci95"] = bootstrap_run_average(
+                [run["total_average_memory_usage"] for run in microservice_data["runs"]])
             microservice_data["runs"].append({microservice: round(avg, 2)})
             protocol_averages[microservice].append(avg)
 
@@ -137,36 +146,16 @@ def process_protocol(base_directory, experiment):
     # Print structured data
     print(json.dumps(results, indent=4))
 
-    # Plot the data
-    x = range(len(protocol_labels))  # the label locations
-    width = 0.35  # the width of the bars
-
-    fig, ax = plt.subplots(figsize=(10, 8))
-    bars1 = ax.bar(x, protocol_averages['M1'], width, label='Mikroserwis 1')
-    bars2 = ax.bar([p + width for p in x], protocol_averages['M2'], width, label='Mikroserwis 2')
-
-    ax.set_xlabel('Mechanizm komunikacji')
-    ax.set_ylabel('Średnie użycie pamięci (%)')
-    ax.set_title('Średnie użycie pamięci przez mechanizm komunikacji')
-    ax.set_xticks([p + width / 2 for p in x])
-    ax.set_xticklabels(protocol_labels)
-    ax.legend()
-
-    for bar in bars1 + bars2:
-        height = bar.get_height()
-        ax.annotate(f'{height:.2f}%',
-                    xy=(bar.get_x() + bar.get_width() / 2, height),
-                    xytext=(0, 3),  # 3 points vertical offset
-                    textcoords="offset points",
-                    ha='center', va='bottom')
-
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.show()
-
-
-# Main configuration
-base_directory = 'D:\\OneDrive - Politechnika Wroclawska\\magisterka\\wyniki\\ConstantUsers'
-experiment = '100u1000p'
-# Process each protocol
-process_protocol(base_directory, experiment)
+    return results, protocol_averages
+
+
+def main():
+    base_directory = 'D:\\OneDrive - Politechnika Wroclawska\\magisterka\\wyniki\\ConstantUsers'
+    experiment = '100u1000p'
+    protocols = ['rest', 'grpc', 'thrift', 'RabbitMQ sync', 'RabbitMQ async', 'kafka sync', 'kafka async']
+    _, protocol_averages = process_protocol(base_directory, experiment, protocols)
+    plot_protocol_averages(protocols, protocol_averages, *metric_titles['memory'])
+
+
+if __name__ == "__main__":
+    main()
@@ -19,9 +19,15 @@ def merge_jaeger_traces(directory, output_file):
 
     print(f"Successfully merged files from {directory} into {output_file}")
 
-# Directory containing Jaeger tracing files
-directory = r"D:\OneDrive - Politechnika Wroclawska\magisterka\wyniki\ConstantUsers\rest\100u10p\3"
-output_file = r"D:\OneDrive - Politechnika Wroclawska\magisterka\wyniki\ConstantUsers\rest\100u10p\3\merged_traces.json"
 
-# Merge the files
-merge_jaeger_traces(directory, output_file)
+def main():
+    # Directory containing Jaeger tracing files
+    directory = r"D:\OneDrive - Politechnika Wroclawska\magisterka\wyniki\ConstantUsers\rest\100u10p\3"
+    output_file = r"D:\OneDrive - Politechnika Wroclawska\magisterka\wyniki\ConstantUsers\rest\100u10p\3\merged_traces.json"
+
+    # Merge the files
+    merge_jaeger_traces(directory, output_file)
+
+
+if __name__ == "__main__":
+    main()
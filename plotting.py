@@ -0,0 +1,48 @@
+protocol_labels = {
+    'rest': 'REST',
+    'grpc': 'gRPC',
+    'thrift': 'Thrift',
+    'kafka sync': 'Kafka sync',
+    'kafka async': 'Kafka async',
+}
+# y axis label and title of the chart of each usage metric
+metric_titles = {
+    'cpu': ('Średnie użycie CPU (%)', 'Średnie użycie CPU przez mechanizm komunikacji'),
+    'memory': ('Średnie użycie pamięci (%)', 'Średnie użycie pamięci przez mechanizm komunikacji'),
+}
+
+
+def plot_protocol_averages(protocols, protocol_averages, ylabel, title, output_file=None):
+    # matplotlib is slow to import, load it only when a chart is drawn
+    import matplotlib.pyplot as plt
+
+    labels = [protocol_labels.get(protocol.lower(), protocol) for protocol in protocols]
+    x = range(len(labels))  # the label locations
+    width = 0.35  # the width of the bars
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    bars1 = ax.bar(x, protocol_averages['M1'], width, label='Mikroserwis 1')
+    bars2 = ax.bar([p + width for p in x], protocol_averages['M2'], width, label='Mikroserwis 2')
+
+    ax.set_xlabel('Mechanizm komunikacji')
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.set_xticks([p + width / 2 for p in x])
+    ax.set_xticklabels(labels)
+    ax.legend()
+
+    for bar in bars1 + bars2:
+        height = bar.get_height()
+        ax.annotate(f'{height:.2f}%',
+                    xy=(bar.get_x() + bar.get_width() / 2, height),
+                    xytext=(0, 3),  # 3 points vertical offset
+                    textcoords="offset points",
+                    ha='center', va='bottom')
+
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    if output_file:
+        plt.savefig(output_file)
+        plt.close(fig)
+    else:
+        plt.show()
@@ -0,0 +1,211 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from traces import find_trace_files, iter_traces, validate_sample_rate
+
+
+def span_service(span, processes):
+    if 'process' in span:
+        return span['process']['serviceName']
+    return processes[span['processID']]['serviceName']
+
+
+def span_parent(span):
+    references = span.get('references') or []
+    parent = next((ref for ref in references if ref['refType'] == 'CHILD_OF'), None)
+    if parent is None:
+        parent = next((ref for ref in references if ref['refType'] == 'FOLLOWS_FROM'), None)
+    return parent
+
+
+def flatten_spans(file_path, sample_rate=None):
+    span_index = {}
+    parent_keys, follows_from, starts, durations, services, operations = [], [], [], [], [], []
+    for trace_number, trace in enumerate(iter_traces(file_path, sample_rate)):
+        processes = trace.get('processes', {})
+        for span in trace['spans']:
+            span_index[(trace_number, span['spanID'])] = len(starts)
+            parent = span_parent(span)
+            parent_keys.append((trace_number, parent['spanID'] if parent else None))
+            follows_from.append(parent is not None and parent['refType'] == 'FOLLOWS_FROM')
+            starts.append(span['startTime'])
+            durations.append(span['duration'])
+            services.append(span_service(span, processes))
+            operations.append(span['operationName'])
+
+    starts = np.array(starts, dtype=np.int64)
+    return {
+        'parent': np.array([span_index.get(key, -1) for key in parent_keys], dtype=np.int64),
+        'follows_from': np.array(follows_from, dtype=bool),
+        'start': starts,
+        'end': starts + np.array(durations, dtype=np.int64),
+        'service': np.array(services, dtype=object),
+        'operation': np.array(operations, dtype=object),
+    }
+
+
+def clip_to_parent(spans):
+    # Child intervals limited to their parent, async consumers may outlive the span that sent the message
+    # or start only after it has ended
+    parent = spans['parent']
+    children = np.flatnonzero(parent >= 0)
+    parent_starts, parent_ends = spans['start'][parent[children]], spans['end'][parent[children]]
+    starts = np.minimum(np.maximum(spans['start'][children], parent_starts), parent_ends)
+    ends = np.maximum(np.minimum(spans['end'][children], parent_ends), starts)
+    return children, starts, ends
+
+
+def detached_spans(spans):
+    # Async consumers (FOLLOWS_FROM, or starting after the sender has ended) are not waited for by their
+    # parent, their subtree gets a critical path of its own instead of being clipped away
+    parent = spans['parent']
+    follows_from = spans.get('follows_from', np.zeros(len(parent), dtype=bool))
+    parent_ends = spans['end'][np.maximum(parent, 0)]
+    return (parent >= 0) & (follows_from | (spans['start'] >= parent_ends))
+
+
+def compute_self_times(spans):
+    parent = spans['parent']
+    self_times = spans['end'] - spans['start']
+    children, starts, ends = clip_to_parent(spans)
+    if len(children) == 0:
+        return self_times
+
+    # Sweep the children of every parent in start order, each interval only adds the part
+    # that is not already covered by the children before it
+    order = np.lexsort((starts, parent[children]))
+    children, starts, ends = children[order], starts[order], ends[order]
+    owners = parent[children]
+    offsets = spans['start'][owners]
+    group_ids = np.cumsum(np.r_[True, owners[1:] != owners[:-1]]) - 1
+    span_width = int((spans['end'] - spans['start']).max()) + 1
+    base = group_ids * span_width
+    covered_until = np.maximum.accumulate(base + ends - offsets)
+    previous_end = np.r_[-1, covered_until[:-1]] - base
+    uncovered_start = np.maximum(starts - offsets, previous_end)
+    union = np.maximum(ends - offsets - uncovered_start, 0)
+
+    self_times -= np.bincount(owners, weights=union, minlength=len(parent)).astype(np.int64)
+    return self_times
+
+
+def effective_intervals(spans, detached):
+    # Every span limited to the effective interval of its parent, level by level from the roots
+    parent = spans['parent']
+    starts, ends = spans['start'].copy(), spans['end'].copy()
+    done = (parent < 0) | detached
+    while not done.all():
+        level = ~done & done[np.maximum(parent, 0)] & (parent >= 0)
+        if not level.any():
+            break
+        starts[level] = np.minimum(np.maximum(starts[level], starts[parent[level]]), ends[parent[level]])
+        ends[level] = np.maximum(np.minimum(ends[level], ends[parent[level]]), starts[level])
+        done |= level
+    return starts, ends
+
+
+def compute_critical_path(spans):
+    # Every span on the path is walked backwards from its end: the last child finishing before the
+    # cursor joins the path and the cursor moves to that child's start. The span itself is charged
+    # only with the gaps between the children it waited for. All spans walk in parallel, one step per round.
+    # Detached async consumers start their own path, so the receiving service is not lost behind the broker.
+    parent = spans['parent']
+    detached = detached_spans(spans)
+    starts, ends = effective_intervals(spans, detached)
+    critical_times = np.zeros(len(parent), dtype=np.int64)
+    on_path = (parent < 0) | detached
+    if len(parent) == 0:
+        return critical_times, on_path
+
+    # Children sorted by parent and end, for equal ends the longest child comes last
+    children = np.flatnonzero((parent >= 0) & ~detached & (ends > starts))
+    children = children[np.lexsort((-starts[children], ends[children], parent[children]))]
+    owners = parent[children]
+    span_width = int((ends - starts).max()) + 1
+    keys = owners * span_width + ends[children] - starts[owners]
+
+    walkers = np.flatnonzero(on_path)
+    cursors = ends[walkers]
+    while len(walkers):
+        positions = np.searchsorted(keys, walkers * span_width + cursors - starts[walkers], side='right') - 1
+        found = positions >= 0
+        found[found] = owners[positions[found]] == walkers[found]
+
+        finished = walkers[~found]
+        critical_times[finished] += cursors[~found] - starts[finished]
+
+        waiting, cursors = walkers[found], cursors[found]
+        next_children = children[positions[found]]
+        critical_times[waiting] += cursors - ends[next_children]
+        on_path[next_children] = True
+
+        walkers = np.r_[waiting, next_children]
+        cursors = np.r_[starts[next_children], ends[next_children]]
+    return critical_times, on_path
+
+
+def analyse_file(file_path, sample_rate=None):
+    spans = flatten_spans(file_path, sample_rate)
+    critical_times, on_path = compute_critical_path(spans)
+    return pd.DataFrame({
+        'service': spans['service'],
+        'operation': spans['operation'],
+        'duration': spans['end'] - spans['start'],
+        'self_time': compute_self_times(spans),
+        'critical_time': critical_times,
+        'on_critical_path': on_path,
+    })
+
+
+def summarize(frame):
+    summary = frame.groupby(['protocol', 'service', 'operation']).agg(
+        spans=('duration', 'size'),
+        mean_duration=('duration', 'mean'),
+        mean_self_time=('self_time', 'mean'),
+        total_self_time=('self_time', 'sum'),
+        total_critical_time=('critical_time', 'sum'),
+        on_critical_path=('on_critical_path', 'sum'),
+    ).reset_index()
+    protocol_totals = summary.groupby('protocol')
+    summary['self_time_share'] = summary['total_self_time'] / protocol_totals['total_self_time'].transform('sum') * 100
+    summary['critical_path_share'] = (summary['total_critical_time'] /
+                                      protocol_totals['total_critical_time'].transform('sum') * 100)
+    # microseconds to milliseconds
+    for column in ['mean_duration', 'mean_self_time', 'total_self_time', 'total_critical_time']:
+        summary[column] = summary[column] / 1000
+    return summary.round(2)
+
+
+def process_protocol(base_directory, experiment, protocols, sample_rate=None):
+    validate_sample_rate(sample_rate)
+    frames = []
+    for protocol in protocols:
+        print(f"Processing protocol: {protocol}")
+        path = os.path.join(base_directory, protocol, experiment)
+        for i in range(1, 4):
+            run_path = os.path.join(path, str(i))
+            for file in find_trace_files(run_path):
+                print(f"Processing file: {file}")
+                frame = analyse_file(file, sample_rate)
+                frame['protocol'] = protocol
+                frames.append(frame)
+
+    if not frames:
+        return None
+    summary = summarize(pd.concat(frames, ignore_index=True))
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(summary.to_string(index=False))
+    return summary
+
+
+def main():
+    base_directory = 'D:\\OneDrive - Politechnika Wroclawska\\magisterka\\wyniki\\ConstantUsers'
+    experiment = '500u10p'
+    protocols = ['rest', 'grpc', 'thrift', 'RabbitMQ sync', 'RabbitMQ async', 'Kafka sync', 'Kafka async']
+    process_protocol(base_directory, experiment, protocols)
+
+
+if __name__ == "__main__":
+    main()
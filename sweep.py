@@ -0,0 +1,330 @@
+import glob
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+microservices = ['M1', 'M2']
+# Files written by the sweep for every run, under <results_directory>/runs/<protocol>/<experiment>/<run>,
+# so the raw run directories only ever hold the exported data
+merged_file = 'merged_traces.json'
+durations_file = 'durations.json'
+window_file = 'window.json'
+usage_file = '{metric}.json'
+results_file = 'results.csv'
+
+
+def sampled_name(file_name, sample_rate):
+    # Sampled and full analyses write separate files, so neither is taken as up to date for the other
+    if sample_rate is None or sample_rate >= 1:
+        return file_name
+    name, extension = os.path.splitext(file_name)
+    return f"{name}-sampled-{sample_rate:g}{extension}"
+
+
+def discover_runs(base_directory, experiments=None, protocols=None, results_directory=None):
+    # ConstantUsers/<protocol>/<experiment>/<run>
+    # The scripts disagree on the case of directory names ('kafka sync', 'Kafka sync'), directories are
+    # matched case-insensitively and the name from the config is passed on, as the analyses compare it exactly
+    canonical_protocols = {protocol.lower(): protocol for protocol in protocols or []}
+    runs = []
+    for directory in sorted(os.listdir(base_directory)):
+        protocol_path = os.path.join(base_directory, directory)
+        if not os.path.isdir(protocol_path) or (
+                results_directory and os.path.abspath(protocol_path) == os.path.abspath(results_directory)):
+            continue
+        protocol = canonical_protocols.pop(directory.lower(), None) if protocols else directory
+        if protocol is None:
+            print(f"Skipping directory {protocol_path}: it matches none of the selected protocols")
+            continue
+        for experiment in sorted(os.listdir(protocol_path)):
+            experiment_path = os.path.join(protocol_path, experiment)
+            if (experiments and experiment not in experiments) or not os.path.isdir(experiment_path):
+                continue
+            for run in sorted(os.listdir(experiment_path)):
+                if run.isdigit() and os.path.isdir(os.path.join(experiment_path, run)):
+                    runs.append((protocol, experiment, run, os.path.join(experiment_path, run)))
+    for protocol in canonical_protocols.values():
+        print(f"No directory found for protocol: {protocol}")
+    return runs
+
+
+def run_output_directory(results_directory, protocol, experiment, run):
+    return os.path.join(results_directory, 'runs', protocol, experiment, run)
+
+
+def find_simulation_log(run_path):
+    log_dir = next((d for d in os.listdir(run_path) if 'constantuserstests-' in d), None)
+    if log_dir is None:
+        return None
+    log_file_path = os.path.join(run_path, log_dir, 'simulation.log')
+    return log_file_path if os.path.exists(log_file_path) else None
+
+
+def usage_files(run_path, microservice, prefix):
+    microservice_path = os.path.join(run_path, microservice)
+    if not os.path.isdir(microservice_path):
+        return []
+    return sorted(os.path.join(microservice_path, f) for f in os.listdir(microservice_path)
+                  if f.startswith(prefix) and f.endswith('.csv'))
+
+
+def replace_output(output_file, write):
+    # Outputs are written under a temporary name and renamed when complete, a task that fails
+    # half way leaves no output behind that would look up to date on the next sweep
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    temporary_file = output_file + '.tmp'
+    try:
+        write(temporary_file)
+        os.replace(temporary_file, output_file)
+    finally:
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
+
+
+def write_json(output_file, data, indent=None):
+    def write(file_path):
+        with open(file_path, 'w') as f:
+            json.dump(data, f, indent=indent)
+
+    replace_output(output_file, write)
+
+
+def merge_task(run_path, output_file):
+    from merge_traces import merge_jaeger_traces
+
+    replace_output(output_file, lambda file_path: merge_jaeger_traces(run_path, file_path))
+
+
+def latency_task(trace_files, protocol, sample_rate, output_file):
+    import traces
+
+    durations = {'SUCCESS': [], 'FAILURE': []}
+    for file in trace_files:
+        file_durations = traces.filter_spans(traces.parse_data(file, sample_rate), protocol)
+        durations['SUCCESS'].extend(file_durations['SUCCESS'])
+        durations['FAILURE'].extend(file_durations['FAILURE'])
+    write_json(output_file, durations)
+
+
+def window_task(log_file_path, protocol, output_file):
+    from cpu_usage_all_new import extract_times_from_simulation_log
+
+    start_time, end_time = extract_times_from_simulation_log(log_file_path, protocol)
+    write_json(output_file, {'start': start_time.isoformat(), 'end': end_time.isoformat()})
+
+
+def usage_task(metric, window_path, run_path, microservice, protocol, experiment, run, output_file):
+    import importlib
+
+    import pandas as pd
+
+    module = importlib.import_module({'cpu': 'cpu_usage_all_new', 'memory': 'memory_usage'}[metric])
+    with open(window_path, 'r') as f:
+        window = json.load(f)
+    start_time, end_time = pd.Timestamp(window['start']), pd.Timestamp(window['end'])
+
+    # None for runs excluded from the averages, written as null so the task stays up to date
+    run_data = module.process_run(run_path, microservice, start_time, end_time, protocol, experiment, run)
+    write_json(output_file, run_data, indent=4)
+
+
+def read_json(file_path):
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+
+def aggregate_task(runs, results_directory, sample_rate=None):
+    import numpy as np
+    import pandas as pd
+
+    from bootstrap import bootstrap_latency, bootstrap_run_average
+    from plotting import metric_titles, plot_protocol_averages
+    from traces import compute_statistics
+
+    rows = []
+    run_durations = {}
+    for protocol, experiment, run, _ in runs:
+        row = {'experiment': experiment, 'protocol': protocol, 'run': run}
+        output_directory = run_output_directory(results_directory, protocol, experiment, run)
+        durations = read_json(os.path.join(output_directory, sampled_name(durations_file, sample_rate)))
+        if durations is not None:
+            # microseconds to milliseconds
+            success = [d / 1000 for d in durations['SUCCESS']]
+            run_durations.setdefault((experiment, protocol), []).append(success)
+            stats = compute_statistics(success)
+            row.update({'ok': len(durations['SUCCESS']), 'ko': len(durations['FAILURE']),
+                        'mean_ms': stats['mean'], '95th_ms': stats['95th'], '99th_ms': stats['99th']})
+        for metric in ('cpu', 'memory'):
+            for microservice in microservices:
+                usage = read_json(os.path.join(output_directory, microservice, usage_file.format(metric=metric)))
+                if usage is not None:
+                    row[f'{metric}_{microservice}'] = usage[f'total_average_{metric}_usage']
+        rows.append(row)
+
+    results = pd.DataFrame(rows).replace('-', np.nan)
+    summaries = []
+    for (experiment, protocol), group in results.groupby(['experiment', 'protocol'], sort=False):
+        summary = {'experiment': experiment, 'protocol': protocol, 'run': 'all',
+                   'ok': group['ok'].sum() if 'ok' in group else np.nan,
+                   'ko': group['ko'].sum() if 'ko' in group else np.nan}
+        if (experiment, protocol) in run_durations:
+            pooled = compute_statistics([d for run in run_durations[(experiment, protocol)] for d in run])
+            intervals = bootstrap_latency(run_durations[(experiment, protocol)])
+            summary.update({'mean_ms': pooled['mean'], '95th_ms': pooled['95th'], '99th_ms': pooled['99th']})
+            for statistic in ('mean', '95th', '99th'):
+                summary[f'{statistic}_ms_ci_low'], summary[f'{statistic}_ms_ci_high'] = intervals[statistic]
+        for metric in ('cpu', 'memory'):
+            for microservice in microservices:
+                column = f'{metric}_{microservice}'
+                if column in group and group[column].notna().any():
+                    values = group[column].dropna()
+                    summary[column] = round(values.mean(), 2)
+                    summary[f'{column}_ci_low'], summary[f'{column}_ci_high'] = bootstrap_run_average(values)
+        summaries.append(summary)
+
+    dataset = pd.concat([results, pd.DataFrame(summaries)], ignore_index=True).replace('-', np.nan)
+    replace_output(os.path.join(results_directory, sampled_name(results_file, sample_rate)),
+                   lambda file_path: dataset.to_csv(file_path, index=False))
+
+    totals = dataset[dataset['run'] == 'all']
+    for experiment, group in totals.groupby('experiment', sort=False):
+        for metric, (ylabel, title) in metric_titles.items():
+            columns = [f'{metric}_{microservice}' for microservice in microservices]
+            if not any(column in group for column in columns):
+                continue
+            averages = {microservice: group.get(f'{metric}_{microservice}', pd.Series(0, index=group.index))
+                        .fillna(0).tolist() for microservice in microservices}
+            plot_protocol_averages(group['protocol'].tolist(), averages, ylabel, f"{title} ({experiment})",
+                                   os.path.join(results_directory, f'{experiment}-{metric}.png'))
+    print(f"Results of {len(runs)} runs saved to {results_directory}")
+
+
+def build_tasks(runs, results_directory, sample_rate=None):
+    tasks = {}
+
+    def add(name, function, args, inputs, outputs, deps=(), allow_failed_deps=False):
+        tasks[name] = {'function': function, 'args': args, 'inputs': inputs, 'outputs': outputs, 'deps': list(deps),
+                       'allow_failed_deps': allow_failed_deps}
+
+    aggregate_deps = []
+    for protocol, experiment, run, run_path in runs:
+        key = f"{protocol}/{experiment}/{run}"
+        output_directory = run_output_directory(results_directory, protocol, experiment, run)
+
+        raw_traces = sorted(glob.glob(os.path.join(run_path, "traces-*.json")))
+        latency_deps = []
+        if raw_traces:
+            merged_path = os.path.join(output_directory, merged_file)
+            add(f"merge {key}", merge_task, (run_path, merged_path), raw_traces, [merged_path])
+            trace_files, latency_deps = [merged_path], [f"merge {key}"]
+        else:
+            trace_files = sorted(glob.glob(os.path.join(run_path, "*.json")))
+        if trace_files:
+            durations_path = os.path.join(output_directory, sampled_name(durations_file, sample_rate))
+            add(f"latency {key}", latency_task, (trace_files, protocol, sample_rate, durations_path),
+                trace_files, [durations_path], latency_deps)
+            aggregate_deps.append(f"latency {key}")
+
+        log_file_path = find_simulation_log(run_path)
+        if log_file_path is None:
+            continue
+        window_path = os.path.join(output_directory, window_file)
+        add(f"window {key}", window_task, (log_file_path, protocol, window_path), [log_file_path], [window_path])
+        for metric, prefix in (('cpu', 'CPU Usage'), ('memory', 'Memory heap')):
+            for microservice in microservices:
+                csv_files = usage_files(run_path, microservice, prefix)
+                if not csv_files:
+                    continue
+                usage_path = os.path.join(output_directory, microservice, usage_file.format(metric=metric))
+                name = f"{metric} {microservice} {key}"
+                add(name, usage_task, (metric, window_path, run_path, microservice, protocol, experiment, run,
+                                       usage_path),
+                    [window_path] + csv_files, [usage_path], [f"window {key}"])
+                aggregate_deps.append(name)
+
+    results_path = os.path.join(results_directory, sampled_name(results_file, sample_rate))
+    add("aggregate", aggregate_task, (runs, results_directory, sample_rate),
+        [output for name in aggregate_deps for output in tasks[name]['outputs']], [results_path], aggregate_deps,
+        allow_failed_deps=True)
+    return tasks
+
+
+def is_up_to_date(task):
+    if not all(os.path.exists(output) for output in task['outputs']):
+        return False
+    inputs = [path for path in task['inputs'] if os.path.exists(path)]
+    if not inputs:
+        return True
+    newest_input = max(os.path.getmtime(path) for path in inputs)
+    return min(os.path.getmtime(output) for output in task['outputs']) >= newest_input
+
+
+def run_tasks(tasks, workers=None, force=False):
+    remaining = {name: set(task['deps']) for name, task in tasks.items()}
+    failed = set()
+    running = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while remaining or running:
+            ready = [name for name, deps in remaining.items() if not deps]
+            for name in ready:
+                del remaining[name]
+                task = tasks[name]
+                failed_deps = sorted(dep for dep in task['deps'] if dep in failed)
+                if failed_deps and not task['allow_failed_deps']:
+                    print(f"Skipping {name}: a dependency failed")
+                    failed.add(name)
+                    remove_outputs(task)
+                    finish(name, remaining)
+                    continue
+                if failed_deps:
+                    # The results of the failed tasks are missing from the output
+                    print(f"Running: {name}, without the results of: {', '.join(failed_deps)}")
+                elif not force and is_up_to_date(task):
+                    print(f"Up to date: {name}")
+                    finish(name, remaining)
+                    continue
+                else:
+                    print(f"Running: {name}")
+                running[executor.submit(task['function'], *task['args'])] = name
+
+            if not running:
+                if remaining and not any(not deps for deps in remaining.values()):
+                    raise ValueError(f"Dependency cycle between tasks: {sorted(remaining)}")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                if future.exception() is not None:
+                    print(f"Failed: {name}: {future.exception()}")
+                    failed.add(name)
+                    remove_outputs(tasks[name])
+                finish(name, remaining)
+    return failed
+
+
+def remove_outputs(task):
+    # Outputs of an earlier sweep are stale once the task failed with newer inputs
+    for output in task['outputs']:
+        if os.path.exists(output):
+            os.remove(output)
+
+
+def finish(name, remaining):
+    for deps in remaining.values():
+        deps.discard(name)
+
+
+def sweep(base_directory, experiments=None, protocols=None, results_directory=None, sample_rate=None,
+          workers=None, force=False):
+    from traces import validate_sample_rate
+
+    validate_sample_rate(sample_rate)
+    results_directory = results_directory or os.path.join(base_directory, 'results')
+    runs = discover_runs(base_directory, experiments, protocols, results_directory)
+    print(f"Found {len(runs)} runs in {base_directory}")
+    tasks = build_tasks(runs, results_directory, sample_rate)
+    return run_tasks(tasks, workers, force)
@@ -0,0 +1,57 @@
+import numpy as np
+
+from span_breakdown import compute_critical_path, compute_self_times
+
+
+def make_spans(intervals):
+    # (parent, start, end) per span, parent -1 for a root
+    parent, start, end = zip(*intervals)
+    return {
+        'parent': np.array(parent, dtype=np.int64),
+        'start': np.array(start, dtype=np.int64),
+        'end': np.array(end, dtype=np.int64),
+    }
+
+
+def test_sequential_siblings_are_both_on_critical_path():
+    # root 0-100, A 0-50 with child q 0-40, then B 50-100
+    spans = make_spans([(-1, 0, 100), (0, 0, 50), (0, 50, 100), (1, 0, 40)])
+    critical_times, on_path = compute_critical_path(spans)
+    assert critical_times.tolist() == [0, 10, 50, 40]
+    assert on_path.all()
+
+
+def test_overlapping_child_is_left_off_critical_path():
+    # root 0-100, A 10-60 and B 20-80 overlap, only B is waited for last
+    spans = make_spans([(-1, 0, 100), (0, 10, 60), (0, 20, 80)])
+    critical_times, on_path = compute_critical_path(spans)
+    assert critical_times.tolist() == [40, 0, 60]
+    assert on_path.tolist() == [True, False, True]
+    assert critical_times.sum() == 100
+
+
+def test_async_child_is_clipped_to_parent():
+    spans = make_spans([(-1, 0, 50), (0, 40, 140)])
+    critical_times, _ = compute_critical_path(spans)
+    assert critical_times.tolist() == [40, 10]
+    assert compute_self_times(spans).tolist() == [40, 100]
+
+
+def test_async_child_after_parent_end_does_not_hide_other_children():
+    # trace 1: root 0-10 with a consumer at 500-510, trace 2: root 0-100 with child 0-40
+    spans = make_spans([(-1, 0, 10), (0, 500, 510), (-1, 0, 100), (2, 0, 40)])
+    assert compute_self_times(spans).tolist() == [10, 10, 60, 40]
+
+
+def test_async_consumer_after_sender_has_its_own_critical_path():
+    # root 0-50 sends at 40-45, the consumer runs at 60-100 after the sender has ended
+    spans = make_spans([(-1, 0, 50), (0, 40, 45), (1, 60, 100)])
+    critical_times, on_path = compute_critical_path(spans)
+    assert critical_times.tolist() == [45, 5, 40]
+    assert on_path.all()
+    assert compute_self_times(spans).tolist() == [45, 5, 40]
+
+
+def test_self_time_subtracts_union_of_children():
+    spans = make_spans([(-1, 0, 100), (0, 10, 40), (0, 20, 60), (2, 30, 80)])
+    assert compute_self_times(spans).tolist() == [50, 30, 10, 50]
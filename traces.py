@@ -1,15 +1,71 @@
 import json
+import re
+import zlib
 import numpy as np
 import os
 import glob
-from scipy.stats import describe
+from scipy.stats import binom, describe
+from bootstrap import bootstrap_latency
 # microseconds
 max_duration = 60000000
+confidence_level = 0.95
 
-def parse_data(file_path):
+# Start of a trace object in a Jaeger export: {"traceID": "...", "spans": [...], ...}
+trace_start = re.compile(r'\{\s*"traceID"\s*:\s*"([^"]*)"\s*,\s*"spans"')
+
+
+def parse_data(file_path, sample_rate=None):
+    if not is_sampling(sample_rate):
+        with open(file_path, 'r') as file:
+            return json.load(file)
+    return {'data': list(iter_traces(file_path, sample_rate))}
+
+
+def validate_sample_rate(sample_rate):
+    if sample_rate is not None and not 0 < sample_rate <= 1:
+        raise ValueError(f"Sample rate must be in (0, 1], got {sample_rate}")
+    return sample_rate
+
+
+def is_sampling(sample_rate):
+    return sample_rate is not None and sample_rate < 1
+
+
+def is_sampled(trace_id, sample_rate):
+    if not is_sampling(sample_rate):
+        return True
+    # crc32 is stable between processes, so the same traces are kept in every run and file
+    return zlib.crc32(trace_id.encode()) < sample_rate * 2 ** 32
+
+
+def iter_traces(file_path, sample_rate=None):
     with open(file_path, 'r') as file:
-        data = json.load(file)
-    return data
+        # A single json.load is faster than decoding trace by trace when every trace is kept
+        if not is_sampling(sample_rate):
+            yield from json.load(file).get('data', [])
+            return
+        text = file.read()
+
+    decoder = json.JSONDecoder()
+    found = False
+    for match in trace_start.finditer(text):
+        found = True
+        # Traces that are not sampled are skipped without decoding their spans
+        if is_sampled(match.group(1), sample_rate):
+            trace, _ = decoder.raw_decode(text, match.start())
+            yield trace
+
+    if not found:
+        # Unknown key order, fall back to decoding the whole file
+        for trace in json.loads(text).get('data', []):
+            if is_sampled(trace['traceID'], sample_rate):
+                yield trace
+
+
+def find_trace_files(run_path):
+    # `merge` writes merged_traces.json next to the traces-*.json it was built from,
+    # reading both would count every request twice
+    return glob.glob(os.path.join(run_path, "traces-*.json")) or glob.glob(os.path.join(run_path, "*.json"))
 
 
 def choose_unit(durations):
@@ -57,7 +113,7 @@ def handle_kafka_async(data, durations):
         if start_span['operationName'] == "events.requests send":
             if trace_id not in async_spans:
                 async_spans[trace_id] = {}
-            async_spans[trace_id]['start'] = start_span['startTime'] / 1000.0
+            async_spans[trace_id]['start'] = start_span['startTime']
         else:
             if trace_id not in async_spans:
                 async_spans[trace_id] = {}
@@ -66,7 +122,7 @@ def handle_kafka_async(data, durations):
         if end_span['operationName'] == "events.responses receive":
             if trace_id not in async_spans:
                 async_spans[trace_id] = {}
-            async_spans[trace_id]['end'] = (end_span['startTime'] + end_span['duration']) / 1000.0
+            async_spans[trace_id]['end'] = end_span['startTime'] + end_span['duration']
         else:
             if trace_id not in async_spans:
                 async_spans[trace_id] = {}
@@ -96,7 +152,7 @@ def handle_rabbitmq_async(data, durations):
         if start_span['operationName'] == "events/requests send":
             if trace_id not in async_spans:
                 async_spans[trace_id] = {}
-            async_spans[trace_id]['start'] = start_span['startTime'] / 1000.0
+            async_spans[trace_id]['start'] = start_span['startTime']
         else:
             if trace_id not in async_spans:
                 async_spans[trace_id] = {}
@@ -105,7 +161,7 @@ def handle_rabbitmq_async(data, durations):
         if end_span['operationName'] == "responses receive":
             if trace_id not in async_spans:
                 async_spans[trace_id] = {}
-            async_spans[trace_id]['end'] = (end_span['startTime'] + end_span['duration']) / 1000.0
+            async_spans[trace_id]['end'] = end_span['startTime'] + end_span['duration']
         else:
             if trace_id not in async_spans:
                 async_spans[trace_id] = {}
@@ -180,13 +236,30 @@ def classify_by_error_tag(span, durations, is_success='true'):
         durations['FAILURE'].append(span['duration'])
 
 
-def compute_statistics(durations):
+def percentile_confidence_interval(sorted_durations, percentile, confidence=confidence_level):
+    # Distribution-free interval from order statistics: the rank of the percentile is binomially distributed
+    n = len(sorted_durations)
+    q = percentile / 100
+    lower = int(binom.ppf((1 - confidence) / 2, n, q))
+    upper = int(binom.ppf((1 + confidence) / 2, n, q))
+    return (round(sorted_durations[max(lower - 1, 0)], 2),
+            round(sorted_durations[min(upper, n - 1)], 2))
+
+
+def compute_statistics(durations, with_confidence=False):
     if not durations:
         return {'count': 0, 'min': '-', 'max': '-', 'mean': '-', 'std_dev': '-', '50th': '-', '75th': '-', '95th': '-',
-                '99th': '-'}
+                '99th': '-', '50th_ci': '-', '75th_ci': '-', '95th_ci': '-', '99th_ci': '-'}
     stats = describe(durations)
     percentiles = np.percentile(durations, [50, 75, 95, 99])
+    intervals = {}
+    if with_confidence:
+        sorted_durations = np.sort(durations)
+        for name, percentile in (('50th_ci', 50), ('75th_ci', 75), ('95th_ci', 95), ('99th_ci', 99)):
+            lower, upper = percentile_confidence_interval(sorted_durations, percentile)
+            intervals[name] = f"[{lower}, {upper}]"
     return {
+        **intervals,
         'count': int(stats.nobs),
         'min': round(np.min(durations), 2),
         'max': round(np.max(durations), 2),
@@ -199,12 +272,21 @@ def compute_statistics(durations):
     }
 
 
-def generate_report(durations, protocol_name):
+def generate_report(durations, protocol_name, sample_rate=None):
+    sampled = sample_rate is not None and sample_rate < 1
     unit_factor, unit_name = choose_unit(durations['SUCCESS'] + durations['FAILURE'])
-    stats_success = compute_statistics([d / unit_factor for d in durations['SUCCESS']])
-    stats_failure = compute_statistics([d / unit_factor for d in durations['FAILURE']])
+    stats_success = compute_statistics([d / unit_factor for d in durations['SUCCESS']], sampled)
+    stats_failure = compute_statistics([d / unit_factor for d in durations['FAILURE']], sampled)
     total_requests = stats_success['count'] + stats_failure['count']
 
+    def interval(percentile):
+        if not sampled:
+            return ""
+        return (f" CI{confidence_level * 100:.0f}%(OK={stats_success[percentile + '_ci']} "
+                f"KO={stats_failure[percentile + '_ci']})")
+
+    if sampled:
+        protocol_name = f"{protocol_name} (sampled {sample_rate * 100:.2f}% of traces)"
     print(f"\n---- Global Information for {protocol_name} --------------------------------------------------------")
     print(f"> Unit of measurement: {unit_name}")
     print(f"> Request count: {total_requests} (OK={stats_success['count']} KO={stats_failure['count']})")
@@ -213,48 +295,69 @@ def generate_report(durations, protocol_name):
     print(f"> Mean response time: {stats_success['mean']} (OK={stats_success['mean']} KO={stats_failure['mean']})")
     print(f"> Std deviation: {stats_success['std_dev']} (OK={stats_success['std_dev']} KO={stats_failure['std_dev']})")
     print(
-        f"> Response time 50th percentile: {stats_success['50th']} (OK={stats_success['50th']} KO={stats_failure['50th']})")
+        f"> Response time 50th percentile: {stats_success['50th']} (OK={stats_success['50th']} KO={stats_failure['50th']}){interval('50th')}")
     print(
-        f"> Response time 75th percentile: {stats_success['75th']} (OK={stats_success['75th']} KO={stats_failure['75th']})")
+        f"> Response time 75th percentile: {stats_success['75th']} (OK={stats_success['75th']} KO={stats_failure['75th']}){interval('75th')}")
     print(
-        f"> Response time 95th percentile: {stats_success['95th']} (OK={stats_success['95th']} KO={stats_failure['95th']})")
+        f"> Response time 95th percentile: {stats_success['95th']} (OK={stats_success['95th']} KO={stats_failure['95th']}){interval('95th')}")
     print(
-        f"> Response time 99th percentile: {stats_success['99th']} (OK={stats_success['99th']} KO={stats_failure['99th']})")
+        f"> Response time 99th percentile: {stats_success['99th']} (OK={stats_success['99th']} KO={stats_failure['99th']}){interval('99th')}")
     print(
-        f"> Mean requests/sec: {stats_success['count']/900:.4f}")
+        f"> Mean requests/sec: {stats_success['count'] / (sample_rate if sampled else 1) / 900:.4f}")
 
 
-def process_protocol(base_directory, experiment):
-    # protocols = ['rest', 'grpc', 'thrift', 'RabbitMQ sync', 'RabbitMQ async', 'Kafka sync', 'Kafka async']
-    protocols = ['RabbitMQ async']
+def generate_bootstrap_report(run_durations, protocol_name):
+    unit_factor, unit_name = choose_unit([d for run in run_durations for d in run])
+    intervals = bootstrap_latency([np.asarray(run) / unit_factor for run in run_durations])
+
+    print(f"\n---- Bootstrap {confidence_level * 100:.0f}% confidence intervals for {protocol_name} (OK requests) ----------")
+    print(f"> Unit of measurement: {unit_name}")
+    print(f"> Mean response time: {intervals['mean']}")
+    print(f"> Response time 95th percentile: {intervals['95th']}")
+    print(f"> Response time 99th percentile: {intervals['99th']}")
+
+
+def process_protocol(base_directory, experiment, protocols, sample_rate=None):
+    validate_sample_rate(sample_rate)
     for protocol in protocols:
         print(f"Processing protocol: {protocol}")
         path = os.path.join(base_directory, protocol, experiment)
         aggregate_durations = {'SUCCESS': [], 'FAILURE': []}
+        run_durations = []
 
         for i in range(1, 4):
             run_path = os.path.join(path, str(i))
-            json_files = glob.glob(os.path.join(run_path, "*.json"))
+            json_files = find_trace_files(run_path)
+            run_success = []
             # if protocol == 'RabbitMQ async' and i == 1:
             #     continue
             for file in json_files:
                 print(f"Processing file: {file}")
-                data = parse_data(file)
+                data = parse_data(file, sample_rate)
                 durations = filter_spans(data, protocol)
-                generate_report(durations, f"{protocol} Run {i}")
+                generate_report(durations, f"{protocol} Run {i}", sample_rate)
                 aggregate_durations['SUCCESS'].extend(durations['SUCCESS'])
                 aggregate_durations['FAILURE'].extend(durations['FAILURE'])
+                run_success.extend(durations['SUCCESS'])
                 with open(f"{i}.json", 'w') as f:
                     json.dump(durations, f)
+            # Files of one run belong to the same bootstrap unit
+            if run_success:
+                run_durations.append(run_success)
 
         # Generate aggregated report for all runs of each protocol
-        generate_report(aggregate_durations, f"Total {protocol}")
+        generate_report(aggregate_durations, f"Total {protocol}", sample_rate)
+        generate_bootstrap_report(run_durations, f"Total {protocol}")
 
 
 def main():
     base_directory = 'D:\\OneDrive - Politechnika Wroclawska\\magisterka\\wyniki\\ConstantUsers'
     experiment = '500u10p'
-    process_protocol(base_directory, experiment)
+    # protocols = ['rest', 'grpc', 'thrift', 'RabbitMQ sync', 'RabbitMQ async', 'Kafka sync', 'Kafka async']
+    protocols = ['RabbitMQ async']
+    # Fraction of traces to keep for a quick approximate report, None processes every trace
+    sample_rate = None
+    process_protocol(base_directory, experiment, protocols, sample_rate)
 
 
 if __name__ == "__main__":